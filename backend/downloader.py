@@ -1,49 +1,131 @@
 # backend/downloader.py
 from __future__ import annotations
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs
-import os, re, json, tempfile, shutil, base64
+from urllib.parse import urlparse
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+import os, re, json, tempfile, shutil, base64, hashlib, time
+import atexit
+import contextlib
+import logging
+import http.client
+import functools
+import operator
+import random
+import threading
+import glob
+import mmap
+import subprocess
 
 # 3rd-party
 from youtube_transcript_api import (
     YouTubeTranscriptApi,
-    TranscriptsDisabled,
     NoTranscriptFound,
     CouldNotRetrieveTranscript,
+    TooManyRequests,
 )
+try:
+    from youtube_transcript_api._transcripts import TranscriptListFetcher
+except ImportError:  # internal module moved; fall back to the public API
+    TranscriptListFetcher = None
 from yt_dlp import YoutubeDL
-import assemblyai as aai
+from yt_dlp.utils import DownloadCancelled
+import requests
+
+try:
+    import orjson  # Rust encoder; optional
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.resolve()
+DOWNLOADS_DIR = BASE_DIR / "downloads"
+CACHE_DIR = BASE_DIR / ".cache"
+
+# cache lifetimes, seconds
+SUMMARY_TTL = 30 * 24 * 3600
+TRANSCRIPT_TTL = 7 * 24 * 3600
+PROBE_TTL = 3600  # signed googlevideo URLs in the probe cache expire within hours
+FORMAT_TTL = 6 * 3600  # the winning client + format_id stay valid much longer
+
+AAI_BASE_URL = "https://api.assemblyai.com/v2"
+TRANSCRIPT_API_URL = "https://transcriptapi.com/api/v2/youtube/transcript"
+# status polls back off 1 → 3 → 9 → 15 s: short clips finish on an early poll,
+# long ones don't cost a GET every few seconds for minutes
+AAI_POLL_SECONDS = 1
+AAI_POLL_MAX_SECONDS = 15
+AAI_RETRY_DELAYS = (1, 5, 15)  # seconds, on HTTP 429
+# with a webhook configured, re-check this often anyway in case a callback is lost
+AAI_WEBHOOK_WAIT = 60
+AAI_WEBHOOK_HEADER = "X-AAI-Secret"
+# long audio is cut into pieces transcribed side by side, at most
+# POD_MAX_CONCURRENCY at a time per request
+AUDIO_SEGMENT_SECONDS = int(os.getenv("POD_SEGMENT_SECONDS", "300"))
+AUDIO_SEGMENT_WORKERS = max(1, int(os.getenv("POD_MAX_CONCURRENCY", "5")))
+
+# scratch space for downloaded audio: PP_TMP_DIR if set, else RAM-backed /dev/shm
+# when it has room for an episode plus its split segments (Docker's default is
+# only 64 MB), else the system temp dir
+SHM_MIN_FREE = 512 * 1024 * 1024
+
+def _tmp_base() -> str | None:
+    configured = os.getenv("PP_TMP_DIR", "").strip()
+    if configured:
+        return configured
+    try:
+        if shutil.disk_usage("/dev/shm").free >= SHM_MIN_FREE:
+            return "/dev/shm"
+    except OSError:  # no /dev/shm on this platform
+        pass
+    return None
 
 # -------------------- Helpers --------------------
 
-_YT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{6,}$")
+_YT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")  # real IDs are exactly 11 chars
+# every URL shape in one pass: watch?v=, &v=, vi=, youtu.be/, shorts/, embed/, v/,
+# live/ and attribution_link's percent-encoded "?v=" / "&v=". Hosts and paths
+# match case-insensitively (YOUTU.BE/...); query keys and the ID itself don't.
+_YT_URL_RE = re.compile(
+    r"(?:[?&]vi?=|(?i:%3Fv%3D|%26v%3D|youtu\.be/|/shorts/|/embed/|/v/|/live/))"
+    r"([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])"
+)
+
+def is_video_id(value: str) -> bool:
+    """True for a well-formed 11-char YouTube ID; lets callers reject junk without a request."""
+    return bool(value) and len(value) == 11 and _YT_ID_RE.match(value) is not None
 
+@functools.lru_cache(maxsize=1024)
 def extract_video_id(url: str) -> str:
-    if not url:
-        return ""
-    u = urlparse(url.strip())
-    host = u.netloc.lower()
-    if host.endswith("youtu.be"):
-        seg = u.path.strip("/").split("/")[0]
-        return seg
-    if "youtube.com" in host and "/shorts/" in u.path:
-        parts = [p for p in u.path.split("/") if p]
-        if len(parts) >= 2 and parts[0].lower() == "shorts":
-            return parts[1]
-    if "youtube.com" in host:
-        q = parse_qs(u.query)
-        if "v" in q and q["v"]:
-            return q["v"][0]
-    last = u.path.strip("/").split("/")[-1]
-    if _YT_ID_RE.match(last):
-        return last
-    return ""
+    s = (url or "").strip()
+    if is_video_id(s):  # bare ID
+        return s
+    m = _YT_URL_RE.search(s)
+    return m.group(1) if m else ""
+
+_cue_text = operator.itemgetter("text")
 
 def _join(items) -> str:
-    return " ".join([i.get("text", "").strip() for i in items if i.get("text")])
+    # map/filter keep the per-cue loop in C; no Python frame per cue
+    return " ".join(filter(None, map(str.strip, map(_cue_text, items))))
+
+def _join_prefix(items, limit: int) -> str:
+    """_join(items)[:limit] without walking (or joining) the cues past `limit`."""
+    buf, n = [], 0
+    for t in map(str.strip, map(_cue_text, items)):
+        if t:
+            buf.append(t)
+            n += len(t) + 1
+            if n > limit:  # joined length is n - 1
+                break
+    return " ".join(buf)[:limit]
+
+SNIPPET_CHARS = 1200  # the summary only ever looks at this much transcript
+
+_WS_TRANS = str.maketrans({"\n": " ", "\r": " ", "\t": " "})
 
 def summarize_text_to_json(transcript_text: str) -> dict:
-    snippet = transcript_text.replace("\n", " ")[:1200]
+    # slice first (only the head is used); translate maps 1:1 so length is exact
+    snippet = transcript_text[:SNIPPET_CHARS].translate(_WS_TRANS)
     return {
         "title": "Podcast Pulse — Auto Summary",
         "topics": [{"name": "Key Ideas", "details": snippet}],
@@ -53,144 +135,868 @@ def summarize_text_to_json(transcript_text: str) -> dict:
         "questions": [],
     }
 
-def _write_summary(video_id: str, data: dict) -> str:
-    base = Path(__file__).parent.resolve()
-    downloads = base / "downloads"
-    downloads.mkdir(exist_ok=True)
-    out = downloads / f"{video_id}_summary.txt"
-    with open(out, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def _dumps(data: dict, indent: bool = True) -> bytes:
+    """UTF-8 JSON bytes; indented for files people open, compact for internal cache."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, option=option)
+    if indent:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """
+    Write to a unique temp file in the same directory, then os.replace() it in.
+    Readers (and the summary cache check) never see a half-written file, and
+    concurrent writers for the same video_id can't interleave.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        _unlink_quietly(tmp)
+        raise
+
+def _save_to_disk() -> bool:
+    """
+    SAVE_TO_DISK=0 keeps summaries in the returned result only (read-only or ephemeral
+    disks); nothing is written under downloads/ or .cache/ either.
+    """
+    return os.getenv("SAVE_TO_DISK", "1").strip().lower() not in ("0", "false", "no")
+
+def _write_summary(video_id: str, data: dict) -> str | None:
+    if not _save_to_disk():
+        return None
+    out = DOWNLOADS_DIR / f"{video_id}_summary.txt"
+    try:
+        DOWNLOADS_DIR.mkdir(exist_ok=True)
+        _atomic_write(out, _dumps(data))
+    except OSError as e:  # the summary still goes back in the result
+        logger.warning("could not write summary file %s: %s", out, e)
+        return None
     return str(out)
 
+# -------------------- Cache --------------------
+
+MMAP_MIN_BYTES = 1 << 20  # below this mmap setup costs more than the copy it saves
+
+@functools.lru_cache(maxsize=256)
+def _parsed_summary(path: str, mtime_ns: int) -> dict:
+    """Parsed summary file; a rewrite changes mtime_ns, so stale entries just age out."""
+    with open(path, "rb") as f:
+        if orjson is not None and os.fstat(f.fileno()).st_size >= MMAP_MIN_BYTES:
+            # orjson parses straight out of the page cache, no bytes copy
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return orjson.loads(view)
+        return _loads(f.read())
+
+def _cache_enabled() -> bool:
+    """PP_NO_CACHE=1 forces the full pipeline on every request."""
+    return os.getenv("PP_NO_CACHE", "").strip().lower() not in ("1", "true", "yes")
+
+def _is_fresh(path: Path, ttl: int | None = None) -> bool:
+    try:
+        return not ttl or time.time() - path.stat().st_mtime <= ttl
+    except FileNotFoundError:
+        return False
+
+def _cache_read(path: Path, ttl: int | None = None) -> str | None:
+    if not _cache_enabled() or not _is_fresh(path, ttl):
+        return None
+    try:
+        return path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+def _cache_write(path: Path, data: str | bytes) -> None:
+    """Best effort: a full or read-only disk must not cost a transcript already paid for."""
+    if not _cache_enabled() or not _save_to_disk():
+        return
+    try:
+        path.parent.mkdir(exist_ok=True)
+        _atomic_write(path, data.encode("utf-8") if isinstance(data, str) else data)
+    except OSError as e:
+        logger.warning("could not write cache file %s: %s", path, e)
+
+def _cached_transcript(video_id: str) -> str | None:
+    return _cache_read(DOWNLOADS_DIR / f"{video_id}_transcript.txt", TRANSCRIPT_TTL)
+
+def _store_transcript(video_id: str, text: str) -> None:
+    _cache_write(DOWNLOADS_DIR / f"{video_id}_transcript.txt", text)
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
 # ---- cookies: prefer base64 to avoid multiline env issues ----
+_cookies_lock = threading.Lock()
+_cookies_state: tuple[bytes, str] | None = None  # (digest of env value, file path)
+
 def _cookies_file_from_env() -> str | None:
     """
     Use YTDLP_COOKIES_B64 (base64 Netscape cookies.txt) if present,
-    else YTDLP_COOKIES (raw single-line). Returns path to temp file or None.
+    else YTDLP_COOKIES (raw single-line). Returns path to a cookies file or None.
+    The file is rewritten only when the env value changes, and removed at exit.
     """
+    global _cookies_state
     b64 = os.getenv("YTDLP_COOKIES_B64", "").strip()
     raw = os.getenv("YTDLP_COOKIES", "").strip()
     if not b64 and not raw:
         return None
+    digest = hashlib.blake2b(f"{b64}\0{raw}".encode("utf-8"), digest_size=16).digest()
+    with _cookies_lock:
+        if _cookies_state and _cookies_state[0] == digest and os.path.exists(_cookies_state[1]):
+            return _cookies_state[1]
+        try:
+            data = base64.b64decode(b64).decode("utf-8") if b64 else raw
+        except ValueError:  # binascii.Error / UnicodeDecodeError
+            logger.warning("YTDLP_COOKIES_B64 is not valid base64 UTF-8; using YTDLP_COOKIES")
+            data = raw
+        path = os.path.join(tempfile.gettempdir(), f"pp_cookies_{os.getpid()}.txt")
+        # atomic so a yt-dlp thread never loads a half-rewritten jar (mkstemp → 0600)
+        _atomic_write(Path(path), data.encode("utf-8"))
+        if _cookies_state is None:
+            atexit.register(_unlink_quietly, path)
+        _cookies_state = (digest, path)
+        return path
+
+def _unlink_quietly(path: str) -> None:
     try:
-        data = base64.b64decode(b64).decode("utf-8") if b64 else raw
-    except Exception:
-        data = raw
-    fp = tempfile.NamedTemporaryFile(delete=False, suffix=".txt")
-    fp.write(data.encode("utf-8")); fp.flush(); fp.close()
-    return fp.name
+        os.unlink(path)
+    except OSError:
+        pass
 
 # -------------------- Stage 2: audio download (no ffmpeg) + AAI --------------------
 
-def _download_audio_to_tmp(youtube_url: str, cookies_path: str | None):
+# candidate extractor player clients (order = preference on ties)
+_PLAYER_CLIENTS = [
+    ["web"],                 # default web client
+    ["tv"],                  # tv client
+    ["web", "tv"],           # web + tv
+    ["android"],             # android client
+    ["web_h5", "web"],       # alternate web h5
+]
+PROBE_WORKERS = 4
+
+# speech recognition gains nothing above this (kbps); YouTube's 48-70k opus/AAC
+# streams are a third of the 128-160k ones to download and upload
+ASR_MAX_ABR = 80
+
+def _pick_audio_format(info: dict) -> dict | None:
     """
-    Try multiple yt-dlp strategies to download a small audio file.
-    Returns (local_audio_path, video_id) on success, else (None, error_message).
-    """
-    import shutil, subprocess, sys
-    tmpdir = tempfile.mkdtemp(prefix="pp_")
-    outtpl = os.path.join(tmpdir, "%(id)s.%(ext)s")
-
-    # candidate extractor player clients to try (order matters)
-    client_trials = [
-        ["web"],                 # default web client
-        ["web", "tv"],           # web + tv
-        ["tv"],                  # tv client
-        ["android"],             # android client
-        ["web_h5", "web"],       # alternate web h5
-    ]
-
-    # basic ydl options (we'll mutate per-trial)
-    base_opts = {
+    Best format carrying audio at <= ASR_MAX_ABR (the highest bitrate otherwise),
+    else the best plain http/HLS one. Mirrors the "bestaudio[abr<=80]" selector.
+    """
+    # one pass with running maxima; no intermediate lists
+    best_audio, best_audio_key = None, (False, -1)
+    best_stream, best_stream_abr = None, -1
+    for f in info.get("formats") or ():
+        if not f.get("url"):
+            continue
+        abr = f.get("abr") or 0
+        if (f.get("acodec") or "none") != "none":
+            key = (0 < abr <= ASR_MAX_ABR, abr)
+            if key > best_audio_key:
+                best_audio, best_audio_key = f, key
+        elif best_audio is None and abr > best_stream_abr:
+            proto = f.get("protocol") or ""
+            if "m3u8" in proto or "http" in proto:
+                best_stream, best_stream_abr = f, abr
+    return best_audio or best_stream
+
+# One YoutubeDL per option set. Building one imports/initialises every extractor
+# (~100-300 ms), and Stage 2 builds up to six per request.
+# option key -> (cookies digest it was built with, lease lock, instance)
+_YDL_POOL: dict[str, tuple[bytes | None, threading.Lock, YoutubeDL]] = {}
+_ydl_pool_lock = threading.Lock()
+
+def _cookies_tag(cookiefile: str | None) -> bytes | None:
+    """Digest of the env cookies behind `cookiefile` (the jar is read once per instance)."""
+    state = _cookies_state
+    if cookiefile and state and state[1] == cookiefile:
+        return state[0]
+    return None
+
+@contextlib.contextmanager
+def _throwaway_opts(opts: dict):
+    """
+    YoutubeDL.close() saves its cookie jar back to `cookiefile`. A throwaway
+    instance gets a private copy of the jar so the shared file is never rewritten.
+    """
+    cookiefile = opts.get("cookiefile")
+    if not cookiefile:
+        yield opts
+        return
+    fd, copy = tempfile.mkstemp(prefix="pp_cookies_", suffix=".txt")  # 0600
+    os.close(fd)
+    try:
+        shutil.copyfile(cookiefile, copy)
+        yield {**opts, "cookiefile": copy}
+    finally:
+        _unlink_quietly(copy)
+
+@contextlib.contextmanager
+def _leased_ydl(opts: dict):
+    """
+    Lend the pooled YoutubeDL for `opts` (outtmpl is swapped in per lease).
+    extract_info keeps per-instance state, so a pooled instance serves one
+    thread at a time; a caller that finds it busy gets a throwaway instance.
+    """
+    outtmpl = opts.get("outtmpl")
+    pooled_opts = {k: v for k, v in opts.items() if k != "outtmpl"}
+    key = repr(sorted(pooled_opts.items()))
+    tag = _cookies_tag(pooled_opts.get("cookiefile"))
+    with _ydl_pool_lock:
+        entry = _YDL_POOL.get(key)
+    if entry is None or entry[0] != tag:
+        fresh_entry = (tag, threading.Lock(), YoutubeDL(pooled_opts))
+        with _ydl_pool_lock:
+            entry = _YDL_POOL.get(key)
+            if entry is None or entry[0] != tag:
+                # new cookies replace the stale instance rather than adding a key
+                entry = _YDL_POOL[key] = fresh_entry
+    _, lock, ydl = entry
+    if not lock.acquire(blocking=False):
+        with _throwaway_opts(opts) as own_opts, YoutubeDL(own_opts) as fresh:
+            yield fresh
+        return
+    try:
+        if outtmpl:
+            ydl.params["outtmpl"]["default"] = outtmpl
+        yield ydl
+    finally:
+        lock.release()
+
+def warm_up() -> None:
+    """
+    Build the pooled YoutubeDL for every probe client up front (each costs
+    100-300 ms of extractor setup) so the first Stage 2 request doesn't pay it.
+    """
+    try:
+        base_opts = _ydl_base_opts(_cookies_file_from_env())
+        for clients in _PLAYER_CLIENTS:
+            opts = dict(base_opts)
+            opts["extractor_args"] = {"youtube": {"player_client": clients}}
+            with _leased_ydl(opts):
+                pass
+    except Exception:
+        logger.warning("yt-dlp warm-up failed", exc_info=True)
+
+def _probe(youtube_url: str, base_opts: dict, clients: list[str]):
+    """
+    Metadata-only extract_info for one player client (no download).
+    Returns (clients, info) when it exposes a usable audio format; raises otherwise.
+    """
+    opts = dict(base_opts)
+    opts["extractor_args"] = {"youtube": {"player_client": clients}}
+    with _leased_ydl(opts) as ydl:
+        info = ydl.extract_info(youtube_url, download=False)
+    if not _pick_audio_format(info):
+        raise RuntimeError(f"no audio formats (player_client={'+'.join(clients)})")
+    return clients, info
+
+def _downloaded_path(info: dict) -> str | None:
+    """Where yt-dlp says it wrote the file: known from the info dict, no directory scan."""
+    for d in info.get("requested_downloads") or ():
+        path = d.get("filepath")
+        if path and os.path.isfile(path) and os.path.getsize(path) > 1024:
+            return path
+    return None
+
+def _find_audio(tmpdir: str, vid: str) -> str | None:
+    # check for file with common audio extensions
+    for ext in ("m4a", "mp3", "webm", "opus"):
+        candidate = os.path.join(tmpdir, f"{vid}.{ext}")
+        if os.path.exists(candidate) and os.path.getsize(candidate) > 1024:
+            return candidate
+    # some extracts keep the original extension: pick largest file as likely audio
+    # (scandir caches the stat per entry, so this is one syscall per file)
+    with os.scandir(tmpdir) as it:
+        largest = max((e for e in it if e.is_file()), key=lambda e: e.stat().st_size, default=None)
+    if largest is not None and largest.stat().st_size > 1024:
+        return largest.path
+    return None
+
+# tmpdir of a running download -> Event that aborts it (see _cancel_hook)
+_download_cancels: dict[str, threading.Event] = {}
+
+def _cancel_hook(progress: dict) -> None:
+    """
+    progress_hooks entry, shared by every (pooled) YoutubeDL: raising
+    DownloadCancelled from here aborts the transfer at its next progress tick.
+    Each attempt downloads into its own tmpdir, which identifies its Event.
+    """
+    path = progress.get("tmpfilename") or progress.get("filename") or ""
+    cancel = _download_cancels.get(os.path.dirname(path))
+    if cancel is not None and cancel.is_set():
+        raise DownloadCancelled()
+
+def _try_one_client(youtube_url: str, base_opts: dict, clients: list[str], info: dict | None = None,
+                    cancel: threading.Event | None = None):
+    """
+    One yt-dlp attempt with the given player clients, in its own tmpdir.
+    `info` from a _probe with the same options skips the second metadata fetch;
+    setting `cancel` aborts the download mid-transfer.
+    Returns (local_audio_path, info); raises (tmpdir removed) on failure.
+    """
+    tmpdir = tempfile.mkdtemp(prefix="pp_", dir=_tmp_base())
+    opts = dict(base_opts)
+    opts["outtmpl"] = os.path.join(tmpdir, "%(id)s.%(ext)s")
+    opts["extractor_args"] = {"youtube": {"player_client": clients}}
+    if cancel is not None:
+        _download_cancels[tmpdir] = cancel
+    try:
+        with _leased_ydl(opts) as ydl:
+            if info is None:
+                info = ydl.extract_info(youtube_url, download=True)
+            else:
+                # what download_with_info_file() does: format selection + download only
+                info = ydl.process_ie_result(info, download=True)
+        vid = info.get("id") or extract_video_id(youtube_url)
+        candidate = _downloaded_path(info) or _find_audio(tmpdir, vid)
+        if not candidate:
+            raise RuntimeError(f"no audio file produced (player_client={'+'.join(clients)})")
+        return candidate, info
+    except Exception:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+    finally:
+        _download_cancels.pop(tmpdir, None)
+
+def _ydl_base_opts(cookies_path: str | None) -> dict:
+    # basic ydl options (outtmpl / player_client are set per trial)
+    opts = {
         "quiet": True,
         "no_warnings": True,
         "noprogress": True,
-        "outtmpl": outtpl,
-        # first try m4a/bestaudio; if no file, we fall back below
-        "format": "bestaudio[ext=m4a]/bestaudio/best",
+        # smallest speech-grade audio first, then m4a/bestaudio; the downloader
+        # falls back if no file. The stream is kept as-is (no FFmpegExtractAudio):
+        # AssemblyAI takes AAC and webm/opus directly, so re-encoding only burns CPU.
+        "format": f"bestaudio[abr<={ASR_MAX_ABR}]/bestaudio[ext=m4a]/bestaudio/best",
         "restrictfilenames": True,
         "noplaylist": True,
-        "postprocessors": [
-            # keep postprocessor but it's optional; if ffmpeg missing this will still work
-            {"key": "FFmpegExtractAudio", "preferredcodec": "m4a", "preferredquality": "2"}
-        ],
         "http_headers": {"User-Agent": "Mozilla/5.0"},
         # avoid DASH-only manifests if that causes issues
         "youtube_include_dash_manifest": False,
+        # fragmented (HLS) audio: fetch fragments in parallel; plain https
+        # downloads go in 10 MiB ranges, which YouTube throttles less
+        "concurrent_fragment_downloads": 8,
+        "http_chunk_size": 10 * 1024 * 1024,
+        "retries": 3,
+        "fragment_retries": 3,
+        # module-level function, so the YoutubeDL pool key stays stable
+        "progress_hooks": [_cancel_hook],
     }
     if cookies_path:
-        base_opts["cookiefile"] = cookies_path
+        opts["cookiefile"] = cookies_path
+    if shutil.which("aria2c"):
+        # plain https audio over 16 parallel range requests (YouTube throttles per
+        # connection); HLS/DASH fragments stay on the native downloader above
+        opts["external_downloader"] = {"http": "aria2c"}
+        opts["external_downloader_args"] = {"aria2c": ["-x16", "-s16", "-k1M"]}
+    return opts
 
+def _download_audio_to_tmp(youtube_url: str, cookies_path: str | None,
+                           cancel: threading.Event | None = None, probe: tuple | None = None):
+    """
+    Try multiple yt-dlp strategies to download a small audio file.
+    `probe` is a (clients, info) pair from an earlier _probe with the same base
+    options; it is tried first, without another metadata fetch.
+    Once `cancel` is set the running download aborts and nothing more is tried.
+    Returns (local_audio_path, info) on success, else (None, error_message).
+    """
+    def cancelled() -> bool:
+        return cancel is not None and cancel.is_set()
+
+    base_opts = _ydl_base_opts(cookies_path)
     last_err = None
+    probe_cache = CACHE_DIR / f"probe_{extract_video_id(youtube_url)}.json"
+
+    def from_probe(clients: list[str], info: dict):
+        result = _try_one_client(youtube_url, base_opts, clients, info, cancel)
+        fmt = _pick_audio_format(info) or {}
+        _cache_write(probe_cache, _dumps(
+            {"clients": clients, "format_id": fmt.get("format_id"), "audio_url": fmt.get("url")}, indent=False
+        ))
+        return result
+
+    if probe is not None:
+        try:
+            return from_probe(*probe)
+        except Exception as e:
+            logger.info("yt-dlp download with the earlier probe failed: %s", e)
+            last_err = str(e)
+        if cancelled():
+            return None, "cancelled"
+
+    # A recent probe already knows which client and format work for this video;
+    # pin that format (falling back to the normal selector if it's gone)
+    cached = _cache_read(probe_cache, FORMAT_TTL)
+    if cached:
+        hit = _loads(cached)
+        opts = dict(base_opts)
+        if hit.get("format_id"):
+            opts["format"] = f"{hit['format_id']}/{base_opts['format']}"
+        try:
+            return _try_one_client(youtube_url, opts, hit["clients"], cancel=cancel)
+        except Exception as e:
+            logger.info("yt-dlp download with cached client/format failed: %s", e)
+            last_err = str(e)
+    if cancelled():
+        return None, "cancelled"
+
+    # Probe every client at once (metadata only, each a multi-second round trip),
+    # then download with whichever answers first with audio. A fresh YoutubeDL per
+    # thread keeps yt-dlp's per-instance state from being shared.
+    ex = ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+    futs = [ex.submit(_probe, youtube_url, base_opts, c) for c in _PLAYER_CLIENTS]
     try:
-        for clients in client_trials:
-            opts = dict(base_opts)
-            opts["extractor_args"] = {"youtube": {"player_client": clients}}
+        for fut in as_completed(futs):
+            if cancelled():
+                return None, "cancelled"
             try:
-                with YoutubeDL(opts) as ydl:
-                    info = ydl.extract_info(youtube_url, download=True)
-                    vid = info.get("id") or extract_video_id(youtube_url)
-                    # check for file with common audio extensions
-                    for ext in ("m4a", "mp3", "webm", "opus"):
-                        candidate = os.path.join(tmpdir, f"{vid}.{ext}")
-                        if os.path.exists(candidate) and os.path.getsize(candidate) > 1024:
-                            return candidate, vid
-                    # If there was no postprocessed file, attempt to look for the original ext
-                    # Try to find any file in tmpdir (some extracts keep original extension)
-                    files = [f for f in os.listdir(tmpdir) if os.path.isfile(os.path.join(tmpdir, f))]
-                    if files:
-                        # pick largest file as likely audio
-                        files_sorted = sorted(files, key=lambda f: os.path.getsize(os.path.join(tmpdir, f)), reverse=True)
-                        candidate = os.path.join(tmpdir, files_sorted[0])
-                        if os.path.getsize(candidate) > 1024:
-                            return candidate, vid
-            except Exception as e:
-                # capture the yt-dlp error and keep trying next client
+                clients, info = fut.result()
+            except Exception as e:  # yt-dlp raises DownloadError/ExtractorError and friends
+                logger.info("yt-dlp probe failed: %s", e)
                 last_err = str(e)
-                # continue to next client trial
                 continue
+            try:
+                return from_probe(clients, info)
+            except Exception as e:
+                # capture the yt-dlp error and move on to the next client that answered
+                logger.info("yt-dlp download failed: %s", e)
+                last_err = str(e)
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
 
-        # final fallback: try a very permissive format (no ffmpeg extract)
-        try:
-            opts = dict(base_opts)
-            opts["format"] = "bestaudio/best"
-            opts.pop("postprocessors", None)
-            opts["extractor_args"] = {"youtube": {"player_client": ["web", "android", "tv"]}}
-            with YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=True)
-                vid = info.get("id") or extract_video_id(youtube_url)
-                for f in os.listdir(tmpdir):
-                    candidate = os.path.join(tmpdir, f)
-                    if os.path.isfile(candidate) and os.path.getsize(candidate) > 1024:
-                        return candidate, vid
-        except Exception as e:
-            last_err = (last_err or "") + " | final-permissive: " + str(e)
-            shutil.rmtree(tmpdir, ignore_errors=True)
-            return None, last_err or "unknown yt-dlp failure"
+    if cancelled():
+        return None, "cancelled"
 
+    # final fallback: try a very permissive format
+    opts = dict(base_opts)
+    opts["format"] = "bestaudio/best"
+    try:
+        return _try_one_client(youtube_url, opts, ["web", "android", "tv"], cancel=cancel)
     except Exception as e:
-        shutil.rmtree(tmpdir, ignore_errors=True)
-        return None, str(e)
-
-    # if we reached here, nothing worked
-    shutil.rmtree(tmpdir, ignore_errors=True)
+        logger.warning("yt-dlp permissive fallback failed: %s", e)
+        last_err = (last_err or "") + " | final-permissive: " + str(e)
     return None, last_err or "Could not download audio (unknown reason)"
 
-def _transcribe_with_aai(local_audio_path: str) -> str:
-    aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY", "")
-    if not aai.settings.api_key:
+def _transcribe_with_aai(local_audio_path: str, duration: float | None = None) -> str:
+    # same audio bytes → same text; skip the upload entirely. Hashing reads the
+    # whole file, so only pay for it when the cache can be read and written.
+    cache_path = None
+    if _cache_enabled() and _save_to_disk():
+        cache_path = CACHE_DIR / f"aai_{_file_sha256(local_audio_path)}.txt"
+        cached = _cache_read(cache_path)
+        if cached:
+            return cached
+    parts = _split_audio(local_audio_path, duration)
+    if len(parts) == 1:
+        text = _transcribe_file_with_aai(parts[0])
+    else:
+        # AAI wall time scales with duration; pieces run side by side
+        with ThreadPoolExecutor(max_workers=min(len(parts), AUDIO_SEGMENT_WORKERS)) as ex:
+            text = " ".join(ex.map(_transcribe_file_with_aai, parts))
+    if cache_path is not None:
+        _cache_write(cache_path, text)
+    return text
+
+def _split_audio(path: str, duration: float | None = None) -> list[str]:
+    """
+    Stream-copy (-c copy, no re-encode) the audio into AUDIO_SEGMENT_SECONDS pieces
+    next to the original. Returns [path] when it fits in one piece (by yt-dlp's
+    `duration`), ffmpeg is missing or the split fails.
+    """
+    if duration is not None and duration <= AUDIO_SEGMENT_SECONDS:
+        return [path]
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return [path]
+    stem, ext = os.path.splitext(path)
+    try:
+        subprocess.run(
+            [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", path,
+             "-f", "segment", "-segment_time", str(AUDIO_SEGMENT_SECONDS),
+             "-c", "copy", f"{stem}.part%03d{ext}"],
+            check=True, timeout=600,
+        )
+    except (subprocess.SubprocessError, OSError):
+        return [path]
+    parts = sorted(glob.glob(f"{glob.escape(stem)}.part[0-9][0-9][0-9]{ext}"))
+    if len(parts) == 1:  # duration was unknown and it fit anyway: upload the original
+        _unlink_quietly(parts[0])
+        return [path]
+    return parts or [path]
+
+class _AAIRateLimited(RuntimeError):
+    """AssemblyAI answered 429."""
+
+class _TokenBucket:
+    """Thread-safe token bucket: `rate` tokens refilled evenly over `per` seconds."""
+
+    def __init__(self, rate: int, per: float):
+        self.capacity = float(rate)
+        self.tokens = float(rate)
+        self.fill_rate = rate / per
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> None:
+        """Block until a token is available, then consume it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.fill_rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+# AssemblyAI's documented limit: 20,000 requests / 5 min
+_aai_bucket = _TokenBucket(20000, 300)
+# transcripts in flight across all requests (segments × concurrent videos)
+_aai_slots = threading.BoundedSemaphore(max(1, int(os.getenv("PP_AAI_CONCURRENCY", "16"))))
+
+def _aai_call(fn, *args, **kwargs):
+    """Run one AssemblyAI request under the rate limit, backing off on 429."""
+    for delay in AAI_RETRY_DELAYS + (None,):
+        _aai_bucket.take()
+        try:
+            return fn(*args, **kwargs)
+        except _AAIRateLimited:
+            if delay is None:
+                raise
+            # jitter so a burst of 429'd workers doesn't retry in lockstep
+            time.sleep(delay * random.uniform(1.0, 1.5))
+
+def _aai_request(session, method: str, path: str, **kwargs) -> dict:
+    r = session.request(method, f"{AAI_BASE_URL}{path}", **kwargs)
+    if r.status_code == 429:
+        raise _AAIRateLimited(f"AssemblyAI rate limited on {path}")
+    r.raise_for_status()
+    return r.json()
+
+def _aai_headers() -> dict:
+    key = os.getenv("ASSEMBLYAI_API_KEY", "")
+    if not key:
         raise RuntimeError("ASSEMBLYAI_API_KEY not set")
-    transcriber = aai.Transcriber()
-    transcript = transcriber.transcribe(audio=local_audio_path)  # local file path
-    if getattr(transcript, "status", "") != "completed" or not getattr(transcript, "text", ""):
-        err = getattr(transcript, "error", "no text")
-        raise RuntimeError(f"AssemblyAI failed: {err}")
-    return transcript.text
+    return {"authorization": key}
+
+UPLOAD_BLOCK = 64 * 1024
+
+def _send_file(sock, f) -> None:
+    """
+    sendfile() only stays zero-copy when the kernel owns the TLS record layer
+    (kTLS, Python 3.12+ with OpenSSL built for it). On a regular SSL socket
+    Python falls back to read()+send() in 8 KiB blocks; do that ourselves in
+    UPLOAD_BLOCK pieces through one reused buffer — 8x fewer syscalls and
+    TLS records, still never the whole file in memory.
+    """
+    ktls = getattr(getattr(sock, "_sslobj", None), "uses_ktls_for_send", None)
+    if ktls is not None and ktls():
+        sock.sendfile(f)
+        return
+    buf = bytearray(UPLOAD_BLOCK)
+    view = memoryview(buf)
+    while n := f.readinto(buf):
+        sock.sendall(view[:n])
+
+def _aai_upload(local_audio_path: str, headers: dict) -> str:
+    """POST the raw file to /v2/upload, streamed from disk (see _send_file)."""
+    u = urlparse(AAI_BASE_URL)
+    conn = http.client.HTTPSConnection(u.netloc, timeout=300)
+    try:
+        conn.putrequest("POST", f"{u.path}/upload")
+        for k, v in headers.items():
+            conn.putheader(k, v)
+        conn.putheader("Content-Type", "application/octet-stream")
+        conn.putheader("Content-Length", str(os.path.getsize(local_audio_path)))
+        conn.endheaders()
+        with open(local_audio_path, "rb", buffering=0) as f:
+            _send_file(conn.sock, f)
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status == 429:
+            raise _AAIRateLimited("AssemblyAI rate limited on /upload")
+        if resp.status >= 400:
+            raise RuntimeError(f"AssemblyAI upload failed: HTTP {resp.status}")
+        return json.loads(body)["upload_url"]
+    finally:
+        conn.close()
+
+def _aai_webhook_config() -> dict:
+    """
+    Extra /transcript fields that make AssemblyAI POST to /aai/webhook when done.
+    Needs PP_PUBLIC_BASE_URL (where AAI can reach this API) and AAI_WEBHOOK_SECRET;
+    empty otherwise, which keeps plain polling.
+    """
+    base = os.getenv("PP_PUBLIC_BASE_URL", "").strip().rstrip("/")
+    secret = os.getenv("AAI_WEBHOOK_SECRET", "").strip()
+    if not (base and secret):
+        return {}
+    return {
+        "webhook_url": f"{base}/aai/webhook",
+        "webhook_auth_header_name": AAI_WEBHOOK_HEADER,
+        "webhook_auth_header_value": secret,
+    }
+
+# transcript_id -> Event set by the webhook route
+_aai_waiters: dict[str, threading.Event] = {}
+_aai_waiters_lock = threading.Lock()
+
+def aai_webhook_received(transcript_id: str) -> bool:
+    """Wake the worker waiting on `transcript_id`. False if nobody in this process is."""
+    with _aai_waiters_lock:
+        done = _aai_waiters.get(transcript_id)
+    if done is None:
+        return False
+    done.set()
+    return True
+
+def _transcribe_file_with_aai(local_audio_path: str) -> str:
+    """
+    upload (sendfile) → submit transcript → wait until done.
+    Same flow as the SDK's transcribe(), minus reading the file into memory.
+    With a webhook configured the worker sleeps until AssemblyAI calls back
+    instead of polling on the AAI_POLL_SECONDS backoff.
+    """
+    with _aai_slots:
+        headers = _aai_headers()
+        upload_url = _aai_call(_aai_upload, local_audio_path, headers)
+        return _aai_transcribe_url(upload_url, headers)
+
+def _transcribe_url_with_aai(audio_url: str) -> str:
+    """Let AssemblyAI fetch `audio_url` itself: no local download, no upload."""
+    with _aai_slots:
+        return _aai_transcribe_url(audio_url, _aai_headers())
+
+def _aai_transcribe_url(audio_url: str, headers: dict) -> str:
+    webhook = _aai_webhook_config()
+    with requests.Session() as session:
+        session.headers.update(headers)
+        transcript_id = _aai_call(
+            _aai_request, session, "POST", "/transcript",
+            json={"audio_url": audio_url, **webhook}, timeout=30,
+        )["id"]
+
+        done = threading.Event()
+        delay = AAI_POLL_SECONDS
+        if webhook:
+            with _aai_waiters_lock:
+                _aai_waiters[transcript_id] = done
+        try:
+            while True:
+                if webhook:
+                    # clear after each wake so a callback that arrives before the
+                    # status is final can't turn this into a busy loop
+                    done.wait(AAI_WEBHOOK_WAIT)
+                    done.clear()
+                body = _aai_call(_aai_request, session, "GET", f"/transcript/{transcript_id}", timeout=30)
+                status = body.get("status")
+                if status == "completed" and body.get("text"):
+                    return body["text"]
+                if status in ("completed", "error"):
+                    raise RuntimeError(f"AssemblyAI failed: {body.get('error') or 'no text'}")
+                if not webhook:
+                    time.sleep(delay)
+                    delay = min(delay * 3, AAI_POLL_MAX_SECONDS)
+        finally:
+            if webhook:
+                with _aai_waiters_lock:
+                    _aai_waiters.pop(transcript_id, None)
+
+# -------------------- Stage 1: captions --------------------
+
+# One keep-alive session for every caption request (list → fetch → translate),
+# instead of a fresh TLS handshake per list_transcripts() call.
+_captions_http = requests.Session()
+
+def _list_transcripts(video_id: str):
+    if TranscriptListFetcher is None:
+        return YouTubeTranscriptApi.list_transcripts(video_id)
+    # what list_transcripts() does internally, minus its throwaway Session
+    return TranscriptListFetcher(_captions_http).fetch(video_id)
+
+def _fetch_captions(video_id: str) -> str:
+    """CC via youtube_transcript_api (incl. translate). Returns "" if unavailable."""
+    try:
+        # one listing serves both the English lookup and the translate fallback
+        transcripts = _list_transcripts(video_id)
+        try:
+            t = transcripts.find_transcript(["en", "en-US", "en-GB"])
+            items = t.fetch()
+        except NoTranscriptFound:
+            any_t = next(iter(transcripts), None)
+            if any_t is None:
+                return ""
+            items = any_t.translate("en").fetch()
+        # the full text is only kept for the transcript cache; without it the
+        # summary snippet is all that is needed
+        return _join(items) if _cache_enabled() else _join_prefix(items, SNIPPET_CHARS)
+    except TooManyRequests:
+        logger.warning("caption fetch rate limited by YouTube for %s", video_id)
+        return ""
+    except CouldNotRetrieveTranscript as e:  # disabled / none / not translatable …
+        logger.info("no captions for %s: %s", video_id, type(e).__name__)
+        return ""
+    except requests.RequestException:
+        logger.warning("caption fetch failed for %s", video_id, exc_info=True)
+        return ""
+    except Exception:  # library parsing changes etc. — still fall through to Stage 2
+        logger.exception("unexpected caption error for %s", video_id)
+        return ""
+
+def _fetch_transcriptapi(video_id: str) -> str:
+    """
+    Optional first try when TRANSCRIPT_API_KEY is set: TranscriptAPI.com returns
+    plain text in one GET from IPs YouTube doesn't block. Returns "" otherwise.
+    """
+    key = os.getenv("TRANSCRIPT_API_KEY", "").strip()
+    if not key:
+        return ""
+    try:
+        r = _captions_http.get(
+            TRANSCRIPT_API_URL,
+            params={"video_url": video_id, "format": "text"},
+            headers={"Authorization": f"Bearer {key}"},
+            timeout=10,
+        )
+    except requests.RequestException:
+        logger.warning("TranscriptAPI request failed for %s", video_id, exc_info=True)
+        return ""
+    if r.status_code != 200:
+        logger.info("TranscriptAPI returned HTTP %s for %s", r.status_code, video_id)
+        return ""
+    return r.text
+
+# -------------------- Stages --------------------
+
+class _AudioUnavailable(RuntimeError):
+    """yt-dlp could not fetch any audio; message is user-facing."""
+
+def _stage1(video_id: str) -> str | None:
+    text = _fetch_transcriptapi(video_id) or _fetch_captions(video_id)
+    # isspace() stops at the first real character and allocates nothing, unlike strip()
+    return text if text and not text.isspace() else None
+
+def _direct_url_enabled() -> bool:
+    """
+    PP_AAI_DIRECT_URL=1 hands AssemblyAI the googlevideo audio URL instead of
+    downloading and re-uploading the file. Those URLs are signed for the IP that
+    requested them, so this only works where YouTube doesn't pin them; any
+    failure falls back to the download path.
+    """
+    return os.getenv("PP_AAI_DIRECT_URL", "").strip().lower() in ("1", "true", "yes")
+
+def _direct_audio_url(youtube_url: str, video_id: str, cookies_path: str | None):
+    """
+    (audio_url, probe) for the direct route. `probe` is the (clients, info) pair
+    when a probe had to run, so a fallback download can reuse it; None otherwise.
+    """
+    cached = _cache_read(CACHE_DIR / f"probe_{video_id}.json", PROBE_TTL)
+    if cached:
+        url = _loads(cached).get("audio_url")
+        if url:
+            return url, None
+    try:
+        probe = _probe(youtube_url, _ydl_base_opts(cookies_path), _PLAYER_CLIENTS[0])
+    except Exception as e:
+        logger.info("yt-dlp probe for direct URL failed: %s", e)
+        return None, None
+    fmt = _pick_audio_format(probe[1])
+    return (fmt["url"] if fmt else None), probe
+
+def _stage2_direct(youtube_url: str, video_id: str, cookies_path: str | None,
+                   cancel: threading.Event | None):
+    """(text or None, probe from _direct_audio_url)."""
+    audio_url, probe = _direct_audio_url(youtube_url, video_id, cookies_path)
+    if not audio_url or (cancel is not None and cancel.is_set()):
+        return None, probe
+    try:
+        return _transcribe_url_with_aai(audio_url), probe
+    except _AAIRateLimited:
+        raise
+    except Exception as e:
+        logger.info("AssemblyAI could not use the direct URL for %s, downloading: %s", video_id, e)
+        return None, probe
+
+def _stage2(youtube_url: str, video_id: str,
+            cancel: threading.Event | None = None) -> tuple[str | None, str]:
+    """
+    Download audio → AAI, or hand AAI the audio URL (PP_AAI_DIRECT_URL).
+    Returns (text, source); text is None once `cancel` is set (download aborted, no upload).
+    """
+    cookies_path = _cookies_file_from_env()
+    probe = None
+    if _direct_url_enabled():
+        text, probe = _stage2_direct(youtube_url, video_id, cookies_path, cancel)
+        if text or (cancel is not None and cancel.is_set()):
+            return text, "AssemblyAI (direct URL)"
+    source = "AssemblyAI (file upload)"
+    local_path, info = _download_audio_to_tmp(youtube_url, cookies_path, cancel, probe)
+    if not local_path:
+        if cancel is not None and cancel.is_set():
+            return None, source
+        raise _AudioUnavailable("Could not download audio from YouTube (blocked). Add cookies or try another link.")
+    try:
+        if cancel is not None and cancel.is_set():
+            return None, source
+        return _transcribe_with_aai(local_path, info.get("duration")), source
+    finally:
+        shutil.rmtree(os.path.dirname(local_path), ignore_errors=True)
+
+def _speculative_enabled() -> bool:
+    """PP_SPECULATIVE=1 races Stage 2 against Stage 1 instead of waiting for it."""
+    return os.getenv("PP_SPECULATIVE", "").strip().lower() in ("1", "true", "yes")
+
+def _race_stages(youtube_url: str, video_id: str) -> tuple[str | None, str]:
+    """
+    Run both stages side by side; the first to produce text wins, so latency is
+    max(T1, T2) rather than T1 + T2. Once captions win, `cancel` aborts Stage 2's
+    download at its next progress tick, skips its remaining probes and the upload.
+    """
+    cancel = threading.Event()
+    ex = ThreadPoolExecutor(max_workers=2)
+    f1 = ex.submit(_stage1, video_id)
+    f2 = ex.submit(_stage2, youtube_url, video_id, cancel)
+    ex.shutdown(wait=False)
+    try:
+        done, _ = wait((f1, f2), return_when=FIRST_COMPLETED)
+        if f2 in done and f1 not in done and f2.exception() is None and f2.result()[0]:
+            return f2.result()
+        text = f1.result()  # Stage 1 never raises
+        if text:
+            return text, "transcript"
+        return f2.result()
+    finally:
+        cancel.set()
 
 # -------------------- Main entry --------------------
 
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+# Stage 1/2 runs (captions, yt-dlp, AAI polling) take minutes; cap how many go at
+# once. Cache, seed and singleflight hits never wait for a slot.
+MAX_PIPELINES = max(1, int(os.getenv("PP_MAX_PIPELINES", "4")))
+_pipeline_slots = threading.BoundedSemaphore(MAX_PIPELINES)
+
 def download_audio_from_youtube(youtube_url: str) -> dict:
     """
+    Success results carry the summary dict under "summary"; summary-file cache hits
+    also carry "cached": True.
+
+    0) Cache: downloads/<id>_summary.txt (< SUMMARY_TTL old) or cached transcript → return
     1) Seed (backend/seed/<id>.json) → write & return
     2) CC via youtube_transcript_api (incl. translate) → summarize
     3) Fallback: yt-dlp bestaudio (with cookies) → upload file to AAI → summarize
@@ -199,45 +1005,84 @@ def download_audio_from_youtube(youtube_url: str) -> dict:
     if not video_id:
         return {"error": "Invalid YouTube URL. Could not parse a video ID."}
 
+    # Concurrent requests for the same video share one pipeline run
+    with _inflight_lock:
+        fut = _inflight.get(video_id)
+        owner = fut is None
+        if owner:
+            fut = _inflight[video_id] = Future()
+    if not owner:
+        return fut.result()
+    try:
+        result = _process_video(youtube_url, video_id)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    else:
+        fut.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(video_id, None)
+
+def cached_result(youtube_url: str) -> dict | None:
+    """The pipeline's result when it needs no network (cache, cached transcript, seed), else None."""
+    video_id = extract_video_id(youtube_url)
+    return _local_result(video_id) if video_id else None
+
+def _local_result(video_id: str) -> dict | None:
+    # Cache: no network at all on repeat hits
+    summary_path = DOWNLOADS_DIR / f"{video_id}_summary.txt"
+    if _cache_enabled():
+        try:
+            st = summary_path.stat()
+            if time.time() - st.st_mtime <= SUMMARY_TTL:
+                return {"message": "Processed via cache", "video_id": video_id, "cached": True,
+                        "summary": _parsed_summary(str(summary_path), st.st_mtime_ns)}
+        except FileNotFoundError:  # missing or pruned: rebuild
+            pass
+        except (OSError, ValueError) as e:  # unreadable or torn (pre-atomic) file: rebuild over it
+            logger.warning("ignoring unreadable summary file %s: %s", summary_path, e)
+    cached = _cached_transcript(video_id)
+    if cached:
+        summary = summarize_text_to_json(cached)
+        _write_summary(video_id, summary)
+        return {"message": "Processed via cached transcript", "video_id": video_id, "summary": summary}
+
     # Seed
     seed = Path(__file__).parent / "seed" / f"{video_id}.json"
     if seed.exists():
-        with open(seed, "r", encoding="utf-8-sig") as f:
-            data = json.load(f)
+        raw = seed.read_bytes()
+        if raw[:3] == b"\xef\xbb\xbf":  # seeds saved by Windows editors carry a BOM
+            raw = raw[3:]
+        data = _loads(raw)
         _write_summary(video_id, data)
-        return {"message": "Processed via demo seed", "video_id": video_id}
+        return {"message": "Processed via demo seed", "video_id": video_id, "summary": data}
+    return None
 
-    # Stage 1: CC / translate
-    try:
-        try:
-            items = YouTubeTranscriptApi.get_transcript(video_id, languages=["en", "en-US", "en-GB"])
-        except (NoTranscriptFound, TranscriptsDisabled):
-            transcripts = YouTubeTranscriptApi.list_transcripts(video_id)
-            try:
-                t = transcripts.find_transcript(["en", "en-US", "en-GB"])
-                items = t.fetch()
-            except Exception:
-                any_t = next(iter(transcripts))
-                items = any_t.translate("en").fetch()
-        text = _join(items)
-        if text.strip():
-            summary = summarize_text_to_json(text)
-            _write_summary(video_id, summary)
-            return {"message": "Processed via transcript", "video_id": video_id}
-    except (CouldNotRetrieveTranscript, NoTranscriptFound, TranscriptsDisabled):
-        pass
-    except Exception:
-        pass
+def _process_video(youtube_url: str, video_id: str) -> dict:
+    local = _local_result(video_id)
+    if local is not None:
+        return local
 
-    # Stage 2: download file + AAI
     try:
-        cookies = _cookies_file_from_env()
-        local_path, _ = _download_audio_to_tmp(youtube_url, cookies)
-        if not local_path:
-            return {"error": "Could not download audio from YouTube (blocked). Add cookies or try another link."}
-        text = _transcribe_with_aai(local_path)
-        summary = summarize_text_to_json(text)
-        _write_summary(video_id, summary)
-        return {"message": "Processed via AssemblyAI (file upload)", "video_id": video_id}
+        with _pipeline_slots:
+            if _speculative_enabled():
+                text, source = _race_stages(youtube_url, video_id)
+            else:
+                text, source = _stage1(video_id), "transcript"
+                if not text:
+                    text, source = _stage2(youtube_url, video_id)
+    except _AudioUnavailable as e:
+        return {"error": str(e)}
+    except _AAIRateLimited:
+        logger.warning("AssemblyAI still rate limiting after retries for %s", video_id)
+        return {"error": "rate_limited"}
     except Exception as e:
+        logger.warning("audio fallback failed for %s", video_id, exc_info=True)
         return {"error": f"Audio fallback failed: {e}"}
+
+    _store_transcript(video_id, text)
+    summary = summarize_text_to_json(text)
+    _write_summary(video_id, summary)
+    return {"message": f"Processed via {source}", "video_id": video_id, "summary": summary}
@@ -1,31 +1,55 @@
 # backend/main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from pathlib import Path
-import os, json, sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os, json, sqlite3, asyncio, time, uuid, hmac, threading, hashlib
+import logging
 
-app = FastAPI()
+try:
+    import orjson  # optional; same fallback as the downloader
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    orjson = None
+    DefaultResponse = JSONResponse
+
+# uvicorn only configures its own loggers; without this the pipeline's
+# INFO/WARNING records (downloader, AAI retries) go nowhere useful
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+app = FastAPI(default_response_class=DefaultResponse)
 
 # ---- CORS: allow only known origins (override via env if needed) ----
 DEFAULT_ORIGINS = [
     "http://localhost:3000",                          # CRA dev
+    "https://podcast-pulse-xi.vercel.app",            # production frontend
     os.getenv("VERCEL_FRONTEND", "").strip()          # set to https://<your>.vercel.app
 ]
-ALLOWED = [o for o in DEFAULT_ORIGINS if o]
+ALLOWED = list(dict.fromkeys(o for o in DEFAULT_ORIGINS if o))
 more = os.getenv("EXTRA_ORIGINS", "")
 if more:
     ALLOWED += [x.strip() for x in more.split(",") if x.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=ALLOWED or ["*"],  # fallback to * if nothing provided
+    allow_origins=ALLOWED,  # explicit list only; a "*" entry would override it
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# summaries and history pages are repetitive JSON; small bodies go out as-is
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # ---- Import downloader (works both as package and script) ----
 try:
     from . import downloader  # package context
@@ -35,40 +59,213 @@ except Exception:
 # ---- Static for simple UI (optional) ----
 BASE_DIR = Path(__file__).parent.resolve()
 STATIC_DIR = BASE_DIR / "static"
+DOWNLOADS_DIR = downloader.DOWNLOADS_DIR   # one definition of where summaries live
 STATIC_DIR.mkdir(exist_ok=True)
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR), html=True), name="static")
 
+# ---- History DB: one connection for the process (sqlite caches prepared
+# statements per connection), WAL so readers don't block the writer ----
+# PP_DB_PATH moves it off a read-only app directory (e.g. /tmp/podcast_history.db)
+DB_PATH = Path(os.getenv("PP_DB_PATH", "").strip() or BASE_DIR / "podcast_history.db")
+_db_lock = threading.Lock()   # the connection is shared across worker threads
+
+def _open_db() -> sqlite3.Connection:
+    conn = None
+    try:
+        conn = sqlite3.connect(str(DB_PATH), check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.Error as e:
+        if conn is not None:
+            conn.close()
+        # read-only disk: keep serving, history just lasts for this process only
+        logger.warning("could not open %s, keeping history in memory: %s", DB_PATH, e)
+        conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-64000")   # ~64 MB page cache, kept for the process lifetime
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS summaries ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, video_id TEXT NOT NULL, "
+        "summary TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_ts ON summaries(timestamp DESC)")
+    # one row per video: drop duplicates left by older versions (keep the newest
+    # row that has a summary, the newest row only when none do), then let a
+    # UNIQUE index enforce it
+    conn.execute(
+        "DELETE FROM summaries WHERE id NOT IN ("
+        "SELECT COALESCE(MAX(CASE WHEN summary IS NOT NULL THEN id END), MAX(id)) "
+        "FROM summaries GROUP BY video_id)"
+    )
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_summaries_video_id ON summaries(video_id)")
+    return conn
+
+def _json_dumps(data) -> str:
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False)
+
+def _json_loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def _db_query(sql: str, params: tuple = ()) -> list:
+    with _db_lock:
+        return app.state.db.execute(sql, params).fetchall()
+
+# parsed summaries for hot videos, most recently used last
+SUMMARY_CACHE: "OrderedDict[str, dict]" = OrderedDict()
+SUMMARY_CACHE_SIZE = 512
+_summary_cache_lock = threading.Lock()
+
+def _cache_summary(video_id: str, summary: dict) -> None:
+    with _summary_cache_lock:
+        SUMMARY_CACHE[video_id] = summary
+        SUMMARY_CACHE.move_to_end(video_id)
+        while len(SUMMARY_CACHE) > SUMMARY_CACHE_SIZE:
+            SUMMARY_CACHE.popitem(last=False)
+
+def _cached_summary(video_id: str) -> dict | None:
+    with _summary_cache_lock:
+        summary = SUMMARY_CACHE.get(video_id)
+        if summary is not None:
+            SUMMARY_CACHE.move_to_end(video_id)
+        return summary
+
+# Summary rows are queued and written in batches: one transaction per
+# HISTORY_FLUSH_SECONDS window instead of one per finished download.
+# Readers don't wait for the flush; SUMMARY_CACHE has the summary immediately.
+HISTORY_FLUSH_SECONDS = 0.05
+INSERT_SUMMARY_SQL = "INSERT OR REPLACE INTO summaries (video_id, summary) VALUES (?, ?)"
+# cache hits only backfill rows for summaries written before the DB held them;
+# replacing would bump id/timestamp and reorder /history by last view
+KEEP_SUMMARY_SQL = "INSERT OR IGNORE INTO summaries (video_id, summary) VALUES (?, ?)"
+
+async def _store_summary(video_id: str, summary: dict, replace: bool = True) -> None:
+    """Queue the summary row; it is what /summary serves and /history lists."""
+    _cache_summary(video_id, summary)
+    await app.state.summary_queue.put((video_id, _json_dumps(summary), replace))
+
+def _write_summaries(rows: list[tuple[str, str, bool]]) -> None:
+    with _db_lock:
+        db = app.state.db
+        before = db.total_changes
+        db.execute("BEGIN")
+        try:
+            db.executemany(KEEP_SUMMARY_SQL, [(v, s) for v, s, replace in rows if not replace])
+            # the UNIQUE index on video_id makes each row an upsert; later rows win
+            db.executemany(INSERT_SUMMARY_SQL, [(v, s) for v, s, replace in rows if replace])
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        if db.total_changes != before:
+            _history_cache.clear()
+
+def _drain(queue: asyncio.Queue, rows: list) -> list:
+    while not queue.empty():
+        rows.append(queue.get_nowait())
+    return rows
+
+async def _summary_writer():
+    """Drain the queue in batches until a None sentinel (shutdown) comes through."""
+    queue = app.state.summary_queue
+    while True:
+        rows = [await queue.get()]
+        await asyncio.sleep(HISTORY_FLUSH_SECONDS)   # let back-to-back completions join
+        rows = _drain(queue, rows)
+        stop = None in rows
+        rows = [r for r in rows if r is not None]
+        if rows:
+            try:
+                await asyncio.to_thread(_write_summaries, rows)
+            except Exception:
+                logger.exception("could not write %d summary rows", len(rows))
+        if stop:
+            return
+
 @app.on_event("startup")
-def ensure_dirs():
-    (BASE_DIR / "downloads").mkdir(exist_ok=True)
+async def ensure_dirs():
+    try:
+        DOWNLOADS_DIR.mkdir(exist_ok=True)
+    except OSError as e:  # read-only disk (SAVE_TO_DISK=0): the downloader writes nothing there
+        logger.warning("could not create %s: %s", DOWNLOADS_DIR, e)
+    app.state.db = _open_db()
+    _history_rows((100, 0))   # the default /history page, and the index pages behind it
+    app.state.summary_queue = asyncio.Queue()
+    app.state.summary_writer = asyncio.create_task(_summary_writer())
+    # pay yt-dlp's extractor setup in the background, not on the first request
+    threading.Thread(target=downloader.warm_up, name="ydl-warm-up", daemon=True).start()
+
+@app.on_event("shutdown")
+async def close_db():
+    writer = getattr(app.state, "summary_writer", None)
+    if writer is not None:
+        await app.state.summary_queue.put(None)   # flush what's queued, then stop
+        await writer
+    db = getattr(app.state, "db", None)
+    if db is not None:
+        db.close()
 
 class DownloadRequest(BaseModel):
     youtube_url: str
 
+def _load_summary(video_id: str):
+    # /summary/{video_id} is user input: never build a path from a non-ID
+    if not downloader.is_video_id(video_id):
+        return None
+    summary = _cached_summary(video_id)
+    if summary is not None:
+        return summary
+    rows = _db_query("SELECT summary FROM summaries WHERE video_id = ? LIMIT 1", (video_id,))
+    if rows and rows[0][0]:
+        summary = _json_loads(rows[0][0])
+    else:
+        # summaries the downloader wrote before the DB held them
+        summary_path = DOWNLOADS_DIR / f"{video_id}_summary.txt"
+        try:
+            summary = _json_loads(summary_path.read_bytes())
+        except FileNotFoundError:
+            return None
+    _cache_summary(video_id, summary)
+    return summary
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
-@app.post("/download")
-async def download_podcast(req: DownloadRequest):
+# Pipelines can hold a thread for minutes (or wait on a downloader slot, see
+# PP_MAX_PIPELINES); keep them off the default executor so short to_thread
+# work (SQLite, summary reads) always finds a free worker. Parked runs and
+# singleflight waiters only cost an idle thread, so leave plenty of room.
+PIPELINE_WORKERS = downloader.MAX_PIPELINES + 64
+_pipeline_pool = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+
+async def _run_pipeline(url: str) -> dict:
+    # cache and seed hits are answered here, never queued behind running pipelines
+    result = await asyncio.to_thread(downloader.cached_result, url)
+    if result is not None:
+        return result
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pipeline_pool, downloader.download_audio_from_youtube, url)
+
+async def _download(url: str) -> dict:
     try:
-        url = (req.youtube_url or "").strip()
+        url = (url or "").strip()
         if not url:
             return {"error": "youtube_url is required"}
 
-        result = downloader.download_audio_from_youtube(url)
+        # blocking pipeline (captions, yt-dlp, AAI polling) runs off the event loop
+        result = await _run_pipeline(url)
 
         # If the worker returns a user-facing error, bubble it up with 200
         if isinstance(result, dict) and "error" in result:
             return {"error": result["error"]}
 
         video_id = result.get("video_id", "unknown")
-        summary_path = BASE_DIR / "downloads" / f"{video_id}_summary.txt"
-        if not summary_path.exists():
+        summary_data = result.get("summary")
+        if summary_data is None:
             return {"error": f"Summary not found for {video_id}"}
-
-        with open(summary_path, "r", encoding="utf-8") as f:
-            summary_data = json.load(f)
+        await _store_summary(video_id, summary_data, replace=not result.get("cached"))
 
         return {
             "message": result.get("message", "ok"),
@@ -76,28 +273,184 @@ async def download_podcast(req: DownloadRequest):
             "summary": summary_data
         }
     except Exception as e:
-        # Never leak 500 stacktraces to UI
+        # Never leak 500 stacktraces to UI; keep them in the log instead
+        logger.exception("/download failed for %s", url)
         return {"error": f"Unexpected: {str(e)}"}
 
+def _etag(summary: dict) -> str:
+    return '"%s"' % hashlib.blake2b(_json_dumps(summary).encode("utf-8"), digest_size=8).hexdigest()
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+@app.post("/download")
+async def download_podcast(req: DownloadRequest, request: Request):
+    # A client that already holds this video's summary revalidates with
+    # If-None-Match and gets a 304 without the pipeline running at all
+    # (same freshness rules as the pipeline: SUMMARY_TTL, PP_NO_CACHE)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        try:
+            cached = await asyncio.to_thread(downloader.cached_result, (req.youtube_url or "").strip())
+        except Exception:
+            # the normal path below rebuilds or reports it
+            logger.warning("conditional /download lookup failed for %s", req.youtube_url, exc_info=True)
+            cached = None
+        if cached is not None:
+            etag = _etag(cached["summary"])
+            if _etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+    body = await _download(req.youtube_url)
+    if "summary" in body:
+        return DefaultResponse(body, headers={"ETag": _etag(body["summary"])})
+    return body
+
+class BatchDownloadRequest(BaseModel):
+    youtube_urls: list[str]
+
+MAX_BATCH = 20
+
+@app.post("/download/batch")
+async def download_batch(req: BatchDownloadRequest):
+    if not req.youtube_urls:
+        return JSONResponse({"error": "youtube_urls is required"}, status_code=400)
+    if len(req.youtube_urls) > MAX_BATCH:
+        return JSONResponse({"error": f"At most {MAX_BATCH} URLs per batch"}, status_code=400)
+    # each URL runs in its own worker thread; results keep the request order
+    results = await asyncio.gather(*(_download(u) for u in req.youtube_urls))
+    return {"results": results}
+
+# ---- Async jobs: POST /jobs answers 202 at once, client polls /status/{id} ----
+JOBS: dict[str, dict] = {}   # job_id -> {status, video_id, message, error, updated}
+JOB_TTL = 3600               # finished jobs are forgotten after this many seconds
+_job_tasks: set = set()      # keep references so running tasks aren't GC'd
+
+def _prune_jobs():
+    cutoff = time.time() - JOB_TTL
+    for jid in [j for j, st in JOBS.items() if st["status"] in ("completed", "error") and st["updated"] < cutoff]:
+        JOBS.pop(jid, None)
+
+async def _run_job(job_id: str, url: str):
+    job = JOBS[job_id]
+    job.update(status="processing", updated=time.time())
+    try:
+        result = await _run_pipeline(url)
+    except Exception as e:
+        logger.exception("job %s failed for %s", job_id, url)
+        result = {"error": f"Unexpected: {str(e)}"}
+    if "error" in result:
+        job.update(status="error", error=result["error"], updated=time.time())
+        return
+    try:
+        await _store_summary(result["video_id"], result["summary"], replace=not result.get("cached"))
+    except Exception as e:
+        logger.exception("job %s could not store its summary", job_id)
+        job.update(status="error", error=f"Unexpected: {str(e)}", updated=time.time())
+    else:
+        job.update(status="completed", video_id=result.get("video_id"),
+                   message=result.get("message", "ok"), updated=time.time())
+
+@app.post("/jobs", status_code=202)
+async def create_job(req: DownloadRequest):
+    url = (req.youtube_url or "").strip()
+    if not url:
+        return JSONResponse({"error": "youtube_url is required"}, status_code=400)
+    _prune_jobs()
+    job_id = uuid.uuid4().hex
+    JOBS[job_id] = {"status": "queued", "video_id": None, "message": None, "error": None, "updated": time.time()}
+    task = asyncio.create_task(_run_job(job_id, url))
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/status/{job_id}")
+async def job_status(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+    return {"job_id": job_id, **{k: v for k, v in job.items() if k != "updated"}}
+
+@app.get("/summary/{video_id}")
+async def get_summary(video_id: str, request: Request):
+    summary_data = await asyncio.to_thread(_load_summary, video_id)
+    if summary_data is None:
+        return JSONResponse({"error": f"Summary not found for {video_id}"}, status_code=404)
+    etag = _etag(summary_data)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return DefaultResponse({"video_id": video_id, "summary": summary_data}, headers={"ETag": etag})
+
+@app.post("/aai/webhook")
+async def aai_webhook(request: Request):
+    # AssemblyAI echoes back the header we registered with the transcript
+    secret = os.getenv("AAI_WEBHOOK_SECRET", "").strip()
+    got = request.headers.get(downloader.AAI_WEBHOOK_HEADER, "")
+    # compare bytes: compare_digest raises TypeError on non-ASCII str
+    if not secret or not hmac.compare_digest(got.encode("utf-8"), secret.encode("utf-8")):
+        return JSONResponse({"error": "Forbidden"}, status_code=403)
+    try:
+        payload = _json_loads(await request.body())
+    except ValueError:
+        return JSONResponse({"error": "Invalid JSON"}, status_code=400)
+    if not isinstance(payload, dict):
+        return JSONResponse({"error": "Expected a JSON object"}, status_code=400)
+    transcript_id = str(payload.get("transcript_id") or "")
+    return {"ok": True, "matched": downloader.aai_webhook_received(transcript_id)}
+
+HISTORY_SQL = "SELECT video_id, timestamp FROM summaries ORDER BY timestamp DESC LIMIT ? OFFSET ?"
+HISTORY_MAX = 500
+# History only changes when a summary is stored (which clears this); the TTL
+# picks up rows written by other processes sharing the DB
+HISTORY_CACHE_TTL = 30
+HISTORY_CACHE_PAGES = 64
+_history_cache: dict[tuple[int, int], tuple[float, list]] = {}   # (limit, offset) -> (stamp, rows)
+
+def _cached_history(key: tuple[int, int]) -> list | None:
+    hit = _history_cache.get(key)
+    if hit is not None and time.monotonic() - hit[0] < HISTORY_CACHE_TTL:
+        return hit[1]
+    return None
+
+def _history_rows(key: tuple[int, int]) -> list:
+    # query and fill under the same lock _write_summaries clears under, so a
+    # page read before an insert can't be cached after it
+    with _db_lock:
+        rows = app.state.db.execute(HISTORY_SQL, key).fetchall()
+        if len(_history_cache) >= HISTORY_CACHE_PAGES:
+            _history_cache.clear()
+        _history_cache[key] = (time.monotonic(), rows)
+    return rows
+
 @app.get("/history")
-async def get_history():
-    db_path = BASE_DIR / "podcast_history.db"
-    if not db_path.exists():
-        return {"history": []}
+async def get_history(limit: int = 100, offset: int = 0):
+    limit, offset = max(1, min(limit, HISTORY_MAX)), max(0, offset)
     try:
-        conn = sqlite3.connect(str(db_path))
-        cur = conn.cursor()
-        cur.execute("SELECT video_id, timestamp FROM summaries")
-        rows = cur.fetchall()
-        return {"history": [{"video_id": v, "timestamp": t} for (v, t) in rows]}
+        rows = _cached_history((limit, offset))
+        if rows is None:
+            # idx_summaries_ts serves the ORDER BY; pages are index range scans
+            rows = await asyncio.to_thread(_history_rows, (limit, offset))
+        return {"history": [{"video_id": v, "timestamp": t} for (v, t) in rows],
+                "limit": limit, "offset": offset}
     except Exception:
+        logger.exception("/history query failed")
         return {"history": []}
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
 
 @app.get("/")
 def root():
     return {"message": "Podcast Pulse API - open /static/index.html"}
+
+if __name__ == "__main__":
+    import uvicorn
+    if os.getenv("ENV") == "dev":
+        uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    else:
+        # uvicorn[standard] picks uvloop + httptools on its own. Jobs, webhook
+        # waiters and caches live in-process, so more workers need sticky routing.
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=int(os.getenv("PORT", "8000")),
+            workers=max(1, int(os.getenv("WEB_CONCURRENCY", "1"))),
+        )
@@ -1,36 +1,11 @@
+# Vercel entry point: serve the same FastAPI app as backend/main.py instead of
+# a second copy of its routes and CORS setup.
+# Not deployed: vercel.json only builds the static site (and routes everything
+# to index.html), backend/ sits outside this project root and no Python
+# requirements ship here. The live API is the backend's own deploy (Procfile).
 import os
 import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory
- # Absolute import # Add parent directory
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from downloader import download_audio_from_youtube  # Absolute import
 
-app = FastAPI()
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))  # repo root
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["https://podcast-pulse-xi.vercel.app", "http://localhost:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-class DownloadRequest(BaseModel):
-    youtube_url: str
-
-@app.post("/download")
-async def download_podcast(request: DownloadRequest):
-    try:
-        print(f"Processing URL: {request.youtube_url}")
-        result = download_audio_from_youtube(request.youtube_url)
-        video_id = result.get("video_id", "unknown")
-        if "error" in result:
-            raise HTTPException(status_code=500, detail=f"Error processing request: {result['error']}")
-        # Vercel doesn’t persist files; use a test summary
-        summary = {"title": "Test Summary", "topics": [{"name": "Test", "quotes_advice": ["Test advice"]}]}
-        return {"message": result["message"], "video_id": video_id, "summary": summary}
-    except Exception as e:
-        print(f"Error in /download: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
\ No newline at end of file
+from backend.main import app  # noqa: E402,F401